@@ -0,0 +1,156 @@
+"""
+Versioned archive of updated APKs.
+
+When an APK is updated, the new version is downloaded next to it
+under a temporary name, then its previous version is kept in
+<folder>/.archive/<package>/ as a binary delta (bsdiff4).
+Deltas form a chain anchored on the current APK of the folder:
+the delta of each archived version turns the next newer version
+into it, so an update only computes one delta, and pruning
+only drops the oldest deltas.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+from .repoindex import sha256sum
+
+try:
+    import bsdiff4
+    HAVE_BSDIFF = True
+except ImportError:
+    HAVE_BSDIFF = False
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIRNAME = '.archive'
+VERSIONS_FILENAME = 'versions.json'
+
+
+class ArchiveError(Exception):
+    """
+    Raised when an archived version cannot be reconstructed
+    """
+
+
+def package_dir(folder, packagename):
+    return os.path.join(folder, ARCHIVE_DIRNAME, packagename)
+
+
+def load_versions(folder, packagename):
+    """
+    Return the archive index of packagename:
+    {'head': {...} or None, 'versions': [...]}, newest version first.
+    """
+    try:
+        with open(os.path.join(package_dir(folder, packagename), VERSIONS_FILENAME)) as vbuffer:
+            return json.load(vbuffer)
+    except (IOError, ValueError):
+        return {'head': None, 'versions': []}
+
+
+def write_versions(folder, packagename, index):
+    """
+    Atomically replace the archive index of packagename
+    """
+    directory = package_dir(folder, packagename)
+    fd, tmppath = tempfile.mkstemp(prefix='.' + VERSIONS_FILENAME, dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as vbuffer:
+            json.dump(index, vbuffer, indent=1)
+        os.replace(tmppath, os.path.join(directory, VERSIONS_FILENAME))
+    except BaseException:
+        os.remove(tmppath)
+        raise
+
+
+def commit(folder, filename, new_filename, packagename, old_version_code, new_version_code, keep):
+    """
+    Store the current filename of packagename as a delta against
+    new_filename, the freshly downloaded version, then move
+    new_filename in place of filename and keep only the keep
+    most recent archived versions.
+    The new version is moved in place even if archiving fails.
+    """
+    filepath = os.path.join(folder, filename)
+    new_filepath = os.path.join(folder, new_filename)
+    try:
+        index = load_versions(folder, packagename)
+        old_sha256 = sha256sum(filepath)
+        head = index['head']
+        if head is not None and head['sha256'] != old_sha256:
+            logger.error("%s changed since it was archived, dropping its older versions", filename)
+            for version in index['versions']:
+                remove_delta(folder, packagename, version['versionCode'])
+            index['versions'] = []
+        directory = package_dir(folder, packagename)
+        os.makedirs(directory, exist_ok=True)
+        delta_path = os.path.join(directory, '%s.bsdiff' % old_version_code)
+        bsdiff4.file_diff(new_filepath, filepath, delta_path)
+        index['versions'].insert(0, {'versionCode': int(old_version_code),
+                                     'sha256': old_sha256,
+                                     'size': os.path.getsize(filepath)})
+        index['head'] = {'filename': filename,
+                         'versionCode': int(new_version_code),
+                         'sha256': sha256sum(new_filepath)}
+        write_versions(folder, packagename, index)
+    finally:
+        os.replace(new_filepath, filepath)
+    prune(folder, packagename, keep)
+    logger.info("Archived %s version %s", packagename, old_version_code)
+
+
+def remove_delta(folder, packagename, version_code):
+    try:
+        os.remove(os.path.join(package_dir(folder, packagename), '%s.bsdiff' % version_code))
+    except FileNotFoundError:
+        pass
+
+
+def prune(folder, packagename, keep):
+    """
+    Keep only the keep most recent archived versions of packagename
+    """
+    if keep < 0:
+        raise ValueError("Cannot keep %s versions" % keep)
+    index = load_versions(folder, packagename)
+    if len(index['versions']) <= keep:
+        return
+    for version in index['versions'][keep:]:
+        remove_delta(folder, packagename, version['versionCode'])
+    del index['versions'][keep:]
+    write_versions(folder, packagename, index)
+
+
+def reconstruct(folder, packagename, version_code, output):
+    """
+    Rebuild the archived version_code of packagename
+    into the output file path, by applying the deltas
+    from the current APK down to that version.
+    """
+    index = load_versions(folder, packagename)
+    head = index['head']
+    codes = [version['versionCode'] for version in index['versions']]
+    if head is None or int(version_code) not in codes:
+        raise ArchiveError("Version %s of %s is not archived" % (version_code, packagename))
+    headpath = os.path.join(folder, head['filename'])
+    with open(headpath, 'rb') as fbuffer:
+        data = fbuffer.read()
+    if hashlib.sha256(data).hexdigest() != head['sha256']:
+        raise ArchiveError("%s changed since it was archived" % headpath)
+    for version in index['versions']:
+        delta_path = os.path.join(package_dir(folder, packagename),
+                                  '%s.bsdiff' % version['versionCode'])
+        with open(delta_path, 'rb') as dbuffer:
+            data = bsdiff4.patch(data, dbuffer.read())
+        if version['versionCode'] == int(version_code):
+            break
+    if hashlib.sha256(data).hexdigest() != version['sha256']:
+        raise ArchiveError("Checksum mismatch while rebuilding %s version %s" % (packagename,
+                                                                                 version_code))
+    with open(output, 'wb') as fbuffer:
+        fbuffer.write(data)
+    return output
@@ -22,8 +22,17 @@ import logging
 import argparse
 import configparser
 import warnings
+import threading
+import queue
+import json
+import time
+import tempfile
+
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from enum import IntEnum
+from functools import lru_cache
 
 import requests
 
@@ -38,6 +47,9 @@ from clint.textui import progress
 
 from . import util
 from . import hooks
+from . import server
+from . import repoindex
+from . import archive
 
 try:
     import keyring
@@ -45,6 +57,12 @@ try:
 except ImportError:
     HAVE_KEYRING = False
 
+try:
+    import fcntl
+    HAVE_FCNTL = True
+except ImportError:  # Windows, token cache is only locked within the process
+    HAVE_FCNTL = False
+
 
 try:
     __version__ = '%s [Python%s] ' % (get_distribution('gplaycli').version, sys.version.split()[0])
@@ -53,6 +71,9 @@ except DistributionNotFound:
 
 logger = logging.getLogger(__name__)  # default level is WARNING
 
+# seconds to wait for the token dispenser, the token cache is locked meanwhile
+TOKEN_DISPENSER_TIMEOUT = 30
+
 
 class ERRORS(IntEnum):
     """
@@ -63,6 +84,40 @@ class ERRORS(IntEnum):
     TOKEN_DISPENSER_SERVER_ERROR = 6
     KEYRING_NOT_INSTALLED = 10
     CANNOT_LOGIN_GPLAY = 15
+    BSDIFF_NOT_INSTALLED = 20
+    SEARCH_FAILED = 25
+    ARCHIVE_RESTORE_FAILED = 30
+
+
+def find_config_file():
+    """
+    Return the first existing configuration
+    file among the default locations.
+    """
+    # default local user configs
+    cred_paths_list = [
+        'gplaycli.conf',
+        os.path.expanduser("~") + '/.config/gplaycli/gplaycli.conf',
+        '/etc/gplaycli/gplaycli.conf'
+    ]
+    for config_file in cred_paths_list:
+        if os.path.isfile(config_file):
+            return config_file
+    raise OSError("No configuration file found at %s" % cred_paths_list)
+
+
+@lru_cache(maxsize=None)
+def load_config(config_file):
+    """
+    Parse config_file and return the ConfigParser.
+    Results are cached, so that creating several
+    GPlaycli instances only parses a given file once.
+    The returned parser is shared and must not be modified.
+    """
+    default_values = {}
+    parser = configparser.ConfigParser(default_values)
+    parser.read(config_file)
+    return parser
 
 
 class GPlaycli:
@@ -73,30 +128,35 @@ class GPlaycli:
     token_enable, token_url, config and with methods
     retrieve_token(), connect(),
     download(), search().
+    A single instance can be shared between threads:
+    each call holds its own logged-in API handle, taken
+    from a pool of at most pool_size handles. pool_size
+    defaults to the size option of the Pool config section.
     """
 
-    def __init__(self, args=None, config_file=None):
+    def __init__(self, args=None, config_file=None, pool_size=None):
         # no config file given, look for one
         if config_file is None:
-            # default local user configs
-            cred_paths_list = [
-                'gplaycli.conf',
-                os.path.expanduser("~") + '/.config/gplaycli/gplaycli.conf',
-                '/etc/gplaycli/gplaycli.conf'
-            ]
-            tmp_list = list(cred_paths_list)
-            while not os.path.isfile(tmp_list[0]):
-                tmp_list.pop(0)
-                if not tmp_list:
-                    raise OSError("No configuration file found at %s" % cred_paths_list)
-            config_file = tmp_list[0]
-
-        default_values = {}
-        self.configparser = configparser.ConfigParser(default_values)
-        self.configparser.read(config_file)
+            config_file = find_config_file()
+        elif isinstance(config_file, list):  # -c is parsed with nargs=1
+            config_file = config_file[0]
+
+        self.configparser = load_config(os.path.abspath(config_file))
         self.creds = {key: value for key, value in self.configparser.items("Credentials")}
 
         self.tokencachefile = os.path.expanduser(self.configparser.get("Cache", "token"))
+        self.token_max_age = self.configparser.getint("Cache", "token_max_age", fallback=0)
+        self._local = threading.local()
+        self._api_pool = queue.LifoQueue()
+        self._api_count = 0
+        self._api_lock = threading.Lock()
+        self._token_lock = threading.RLock()
+        self._token_pair = (None, None)
+        if pool_size is None:
+            pool_size = self.configparser.getint("Pool", "size", fallback=4)
+        if pool_size < 1:
+            raise ValueError("Pool size must be at least 1, got %s" % pool_size)
+        self.pool_size = pool_size
         self.api = None
         self.token_passed = False
         self.locale = self.configparser.get("Locale", "locale", fallback="en_GB")
@@ -110,18 +170,22 @@ class GPlaycli:
             self.logging_enable = False
             self.device_codename = 'bacon'
             self.addfiles_enable = False
+            self.index_enable = False
+            self.archive_versions = 0
 
         # if args are passed
         else:
             self.yes = args.yes_to_all
             self.verbose = args.verbose
             if self.verbose:
-                logger.setLevel(logging.INFO)
+                # configure the package logger, so that submodules log as well
+                package_logger = logging.getLogger('gplaycli')
+                package_logger.setLevel(logging.INFO)
                 handler = logging.StreamHandler()
                 formatter = logging.Formatter("[%(levelname)s] %(message)s")
                 handler.setFormatter(formatter)
-                logger.addHandler(handler)
-                logger.propagate = False
+                package_logger.addHandler(handler)
+                package_logger.propagate = False
             logger.info('GPlayCli version %s', __version__)
             logger.info('Configuration file is %s', config_file)
             self.progress_bar = args.progress_bar
@@ -129,6 +193,8 @@ class GPlaycli:
             self.logging_enable = args.logging_enable
             self.device_codename = args.device_codename
             self.addfiles_enable = args.addfiles_enable
+            self.index_enable = args.index_enable
+            self.archive_versions = args.archive_versions
             if args.locale is not None:
                 self.locale = args.locale
             if args.timezone is not None:
@@ -145,10 +211,9 @@ class GPlaycli:
                     self.token_url = args.token_url
 
                 if (args.token_str is None) and (args.gsf_id is None):
-                    self.token, self.gsfid = self.retrieve_token()
+                    self.retrieve_token()
                 elif (args.token_str is not None) and (args.gsf_id is not None):
-                    self.token = args.token_str
-                    self.gsfid = args.gsf_id
+                    self.set_token(args.token_str, args.gsf_id)
                     self.token_passed = True
                 else:  # Either args.token_str or args.gsf_id is None
                     raise TypeError("Token string and GSFID have to be passed at the same time.")
@@ -166,26 +231,35 @@ class GPlaycli:
         it will be used. Else, or if force_new=True,
         a new token is fetched from the token-dispenser
         server located at self.token_url.
+        The token cache is locked meanwhile, so that only one
+        process fetches a token at a time. With force_new=True,
+        a token already renewed by another process is reused.
         """
-        token, gsfid = self.get_cached_token()
-        if token is not None and not force_new:
-            logger.info("Using cached token.")
+        with self._token_lock, self.token_cache_lock():
+            stale_token = self.token
+            token, gsfid = self.get_cached_token()
+            if token is not None and (not force_new or stale_token not in (None, token)):
+                logger.info("Using cached token.")
+                self.set_token(token, gsfid)
+                return token, gsfid
+            logger.info("Retrieving token ...")
+            try:
+                response = requests.get(self.token_url, timeout=TOKEN_DISPENSER_TIMEOUT)
+            except requests.RequestException as request_error:
+                logger.error('Token dispenser request failed: %s', request_error)
+                sys.exit(ERRORS.TOKEN_DISPENSER_SERVER_ERROR)
+            if response.text == 'Auth error':
+                logger.error('Token dispenser auth error, probably too many connections')
+                sys.exit(ERRORS.TOKEN_DISPENSER_AUTH_ERROR)
+            elif response.text == "Server error":
+                logger.error('Token dispenser server error')
+                sys.exit(ERRORS.TOKEN_DISPENSER_SERVER_ERROR)
+            token, gsfid = response.text.split(" ")
+            logger.info("Token: %s", token)
+            logger.info("GSFId: %s", gsfid)
+            self.set_token(token, gsfid)
+            self.write_cached_token(token, gsfid)
             return token, gsfid
-        logger.info("Retrieving token ...")
-        response = requests.get(self.token_url)
-        if response.text == 'Auth error':
-            logger.error('Token dispenser auth error, probably too many connections')
-            sys.exit(ERRORS.TOKEN_DISPENSER_AUTH_ERROR)
-        elif response.text == "Server error":
-            logger.error('Token dispenser server error')
-            sys.exit(ERRORS.TOKEN_DISPENSER_SERVER_ERROR)
-        token, gsfid = response.text.split(" ")
-        logger.info("Token: %s", token)
-        logger.info("GSFId: %s", gsfid)
-        self.token = token
-        self.gsfid = gsfid
-        self.write_cached_token(token, gsfid)
-        return token, gsfid
 
     @hooks.connected
     def download(self, pkg_todownload):
@@ -202,6 +276,7 @@ class GPlaycli:
         success_downloads = []
         failed_downloads = []
         unavail_downloads = []
+        written_files = []
 
         # case where no filenames have been provided
         for index, pkg in enumerate(pkg_todownload):
@@ -221,7 +296,11 @@ class GPlaycli:
                 failed_downloads.append((pkg, request_error))
         if any([d is None for d in details]):
             logger.info("Token has expired while downloading. Retrieving a new one.")
-            self.refresh_token()
+            try:
+                self.refresh_token()
+            except LoginError as login_error:
+                logger.error("Cannot login with the new token (%s)", login_error)
+                return set()
             details = self.api.bulkDetails([pkg[0] for pkg in pkg_todownload])
         position = 1
         for detail, item in zip(details, pkg_todownload):
@@ -231,8 +310,7 @@ class GPlaycli:
 
             # Check for download folder
             download_folder = self.download_folder
-            if not os.path.isdir(download_folder):
-                os.mkdir(download_folder)
+            os.makedirs(download_folder, exist_ok=True)
 
             # Download
             try:
@@ -283,8 +361,13 @@ class GPlaycli:
                 except IOError as exc:
                     logger.error("Error while writing %s : %s", packagename, exc)
                     failed_downloads.append((item, exc))
+                else:
+                    written_files.append(filename)
             position += 1
 
+        if self.index_enable:
+            repoindex.update_index(self.download_folder, written_files)
+
         success_items = set(success_downloads)
         failed_items = set([item[0] for item, error in failed_downloads])
         unavail_items = set([item[0] for item, error in unavail_downloads])
@@ -359,10 +442,145 @@ class GPlaycli:
                               enumerate(result)))
         return all_results
 
+    @hooks.connected
+    def search_batch(self, search_strings, nb_results, free_only=True, workers=8, output=None):
+        """
+        Search all the strings of search_strings concurrently,
+        over the API handle of the calling thread.
+        Results are deduplicated by docId and written to output
+        as JSON lines as soon as each query completes.
+        If the token expires meanwhile, the handle is logged in
+        again once and the failed queries are retried.
+        Return the set of found docIds and the list of failed strings.
+
+        search_strings -- the strings to search on the Play Store
+        nb_results     -- the number of results to keep per string
+        free_only      -- True if only costless apps should be searched for
+        workers        -- the number of queries running at the same time
+        output         -- the file object JSON lines are written to,
+                          sys.stdout by default
+        """
+        if output is None:
+            output = sys.stdout
+        api = self.api
+        refresh_lock = threading.Lock()
+        queries = list(dict.fromkeys(s.strip() for s in search_strings if s.strip()))
+
+        def run_query(search_string, retry=True):
+            used_token = api.authSubToken
+            try:
+                return api.search(search_string, nb_result=nb_results)
+            except IndexError:
+                return []
+            except LoginError:
+                if not retry:
+                    raise
+            # only the first worker failing with this token logs in again
+            with refresh_lock:
+                if api.authSubToken == used_token:
+                    logger.info("Token has expired while searching. Retrieving a new one.")
+                    self.refresh_token(api)
+            return run_query(search_string, retry=False)
+
+        seen = set()
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_query, query): query for query in queries}
+            for future in as_completed(futures):
+                search_string = futures[future]
+                try:
+                    results = future.result()
+                except Exception as exc:
+                    logger.error("Error while searching %s : %s", search_string, exc)
+                    failed.append(search_string)
+                    continue
+                kept = 0
+                for result in results or []:
+                    if kept >= int(nb_results):
+                        break
+                    # same filters as search()
+                    if (len(result['offer']) == 0
+                            or free_only
+                            and result['offer'][0]['checkoutFlowRequired']
+                        ):
+                        continue
+                    kept += 1
+                    if result['docId'] in seen:
+                        continue
+                    seen.add(result['docId'])
+                    print(json.dumps({'query': search_string,
+                                      'docId': result['docId'],
+                                      'versionCode': result['versionCode'],
+                                      'size': result['installationSize']}),
+                          file=output, flush=True)
+        return seen, failed
+
     ########## End public methods ##########
 
     ########## Internal methods ##########
 
+    @property
+    def token(self):
+        return self._token_pair[0]
+
+    @property
+    def gsfid(self):
+        return self._token_pair[1]
+
+    def set_token(self, token, gsfid):
+        """
+        Replace the token and gsfid shared by all API handles
+        """
+        with self._token_lock:
+            self._token_pair = (token, gsfid)
+
+    def get_token(self):
+        """
+        Return a consistent (token, gsfid) snapshot
+        """
+        with self._token_lock:
+            return self._token_pair
+
+    @property
+    def api(self):
+        """
+        The GooglePlayAPI handle held by the current thread,
+        None outside of a connected call.
+        """
+        return getattr(self._local, 'api', None)
+
+    @api.setter
+    def api(self, value):
+        self._local.api = value
+
+    def acquire_api(self):
+        """
+        Take an API handle from the pool. Return None
+        if a new handle has to be created by the caller.
+        When pool_size handles exist, wait until another
+        thread releases one.
+        """
+        try:
+            return self._api_pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._api_lock:
+            if self._api_count < self.pool_size:
+                self._api_count += 1
+                return None
+        return self._api_pool.get()
+
+    def release_api(self):
+        """
+        Give the current thread's API handle back to the pool.
+        Handles that never logged in are replaced by None,
+        so that the next caller creates a fresh one.
+        """
+        api, self.api = self.api, None
+        if api is not None and api.authSubToken is None:
+            api = None
+        self._api_pool.put(api)
+
     def connect(self):
         """
         Connect GplayCli to the Google Play API.
@@ -394,8 +612,8 @@ class GPlaycli:
                 logger.info("Using passed token to connect to API")
             else:
                 logger.info("Using auto retrieved token to connect to API")
-            authsub_token = self.token
-            gsfid = int(self.gsfid, 16)
+            authsub_token, gsfid = self.get_token()
+            gsfid = int(gsfid, 16)
         with warnings.catch_warnings():
             warnings.simplefilter('error')
             try:
@@ -417,13 +635,23 @@ class GPlaycli:
         """
         Retrieve a cached token and gsfid if exist.
         Otherwise return None.
+        Tokens older than self.token_max_age seconds
+        are ignored, so that they are renewed before expiring.
         """
         try:
             with open(self.tokencachefile, 'r') as tcf:
-                token, gsfid = tcf.readline().split()
-                if not token:
-                    token = None
-                    gsfid = None
+                fields = tcf.readline().split()
+            token, gsfid = fields[:2]
+            # older cache files have no timestamp
+            timestamp = float(fields[2]) if len(fields) > 2 else None
+            if not token:
+                token = None
+                gsfid = None
+            elif self.token_max_age and timestamp is not None \
+                    and time.time() - timestamp > self.token_max_age:
+                logger.info("Cached token is older than %s seconds", self.token_max_age)
+                token = None
+                gsfid = None
         except (IOError, ValueError):  # cache file does not exists or is corrupted
             token = None
             gsfid = None
@@ -433,22 +661,53 @@ class GPlaycli:
     def write_cached_token(self, token, gsfid):
         """
         Write the given token and gsfid
-        to the self.tokencachefile file.
+        to the self.tokencachefile file, along with
+        the current time.
         Path and file are created if missing.
+        The file is replaced atomically, readers never
+        see it half-written.
         """
         try:
             # creates cachedir if not exists
             cachedir = os.path.dirname(self.tokencachefile)
-            if not os.path.exists(cachedir):
-                os.mkdir(cachedir)
-            with open(self.tokencachefile, 'w') as tcf:
-                tcf.write("%s %s" % (token, gsfid))
+            os.makedirs(cachedir, exist_ok=True)
+            fd, tmpfile = tempfile.mkstemp(prefix='.token', dir=cachedir)
+            try:
+                with os.fdopen(fd, 'w') as tcf:
+                    tcf.write("%s %s %d" % (token, gsfid, time.time()))
+                os.replace(tmpfile, self.tokencachefile)
+            except BaseException:
+                os.remove(tmpfile)
+                raise
         except IOError as io_error:
             err_str = "Failed to write token to cache file: %s %s" % (
                 self.tokencachefile, io_error.strerror)
             logger.error(err_str)
             raise IOError(err_str)
 
+    @contextmanager
+    def token_cache_lock(self):
+        """
+        Hold an exclusive lock on the token cache,
+        shared with other gplaycli processes.
+        """
+        if not HAVE_FCNTL:
+            yield
+            return
+        try:
+            os.makedirs(os.path.dirname(self.tokencachefile), exist_ok=True)
+            lockfile = open(self.tokencachefile + '.lock', 'a')
+        except IOError as io_error:
+            logger.error("Cannot lock token cache file: %s", io_error)
+            yield
+            return
+        with lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
     def set_download_folder(self, folder):
         """
         Set the download folder for apk
@@ -456,19 +715,32 @@ class GPlaycli:
         """
         self.download_folder = folder
 
-    def refresh_token(self):
+    def refresh_token(self, api=None):
         """
         Get a new token from token-dispenser instance
-        and re-connect to the play-store.
+        and re-connect the given API handle, by default
+        the current one, to the play-store.
+        If another handle already refreshed the token,
+        it is reused instead of fetching a new one.
         """
-        self.retrieve_token(force_new=True)
-        self.api.login(authSubToken=self.token, gsfId=int(self.gsfid, 16))
+        if api is None:
+            api = self.api
+        stale_token = api.authSubToken
+        with self._token_lock:
+            if self.token in (None, stale_token):
+                self.retrieve_token(force_new=True)
+            token, gsfid = self._token_pair
+        api.login(authSubToken=token, gsfId=int(gsfid, 16))
 
     def prepare_analyse_apks(self):
         """
         Gather apks to further check for update
         """
         download_folder = self.download_folder
+        if self.index_enable:
+            # index the folder even if nothing is updated,
+            # download() re-indexes the updated apks
+            repoindex.update_index(download_folder)
         list_of_apks = util.list_folder_apks(download_folder)
         if list_of_apks:
             logger.info("Checking apks ...")
@@ -534,13 +806,70 @@ class GPlaycli:
 
             if self.yes or return_value == 'y':
                 logger.info("Downloading ...")
-                downloaded_packages = self.download(pkg_todownload)
+                if self.archive_versions:
+                    downloaded_packages = self.download_archived(list_apks_to_update)
+                else:
+                    downloaded_packages = self.download(pkg_todownload)
                 return_string = ' '.join(downloaded_packages)
                 print("Updated: " + return_string)
         else:
             print("Everything is up to date !")
             sys.exit(ERRORS.SUCCESS)
 
+    def download_archived(self, list_apks_to_update):
+        """
+        Download updates under a temporary name, then archive the
+        current apks as deltas against them before moving them in
+        place, keeping self.archive_versions versions per package.
+        Current apks stay untouched until their update is downloaded.
+        """
+        if not archive.HAVE_BSDIFF:
+            logger.error("You asked for an archive but bsdiff4 package is not installed")
+            sys.exit(ERRORS.BSDIFF_NOT_INSTALLED)
+        download_folder = self.download_folder
+        pkg_todownload = [[packagename, filename + ".part"]
+                          for packagename, filename, _, _ in list_apks_to_update]
+        updated_files = []
+        try:
+            downloaded_packages = self.download(pkg_todownload)
+            for packagename, filename, apk_version_code, store_version_code in list_apks_to_update:
+                if packagename not in downloaded_packages \
+                        or not os.path.isfile(os.path.join(download_folder, filename + ".part")):
+                    continue
+                try:
+                    archive.commit(download_folder, filename, filename + ".part", packagename,
+                                   apk_version_code, store_version_code, self.archive_versions)
+                except Exception as exc:
+                    logger.error("Error while archiving %s : %s", packagename, exc)
+                updated_files.append(filename)
+        finally:
+            # leftovers of failed or interrupted downloads
+            for _, partname in pkg_todownload:
+                partpath = os.path.join(download_folder, partname)
+                if os.path.exists(partpath):
+                    os.remove(partpath)
+        if self.index_enable:
+            repoindex.update_index(download_folder, updated_files)
+        return downloaded_packages
+
+    def restore_version(self, packagename, version_code, output=None):
+        """
+        Rebuild version version_code of packagename from the
+        archive of the download folder into output,
+        <packagename>_<version_code>.apk by default.
+        Return the path of the rebuilt apk, None on error.
+        """
+        if not archive.HAVE_BSDIFF:
+            logger.error("You asked for an archive but bsdiff4 package is not installed")
+            sys.exit(ERRORS.BSDIFF_NOT_INSTALLED)
+        if output is None:
+            output = "%s_%s.apk" % (packagename, version_code)
+        try:
+            return archive.reconstruct(self.download_folder, packagename, version_code, output)
+        except (archive.ArchiveError, IOError) as exc:
+            logger.error("Error while restoring %s : %s", packagename, exc)
+            return None
+
     def print_failed(self, failed_downloads):
         """
         Print/log failed downloads from failed_downloads
@@ -581,7 +910,7 @@ def main():
     Main function.
     Parse command line arguments
     """
-    parser = argparse.ArgumentParser(description="A Google Play Store Apk downloader"
+    parser = argparse.ArgumentParser(description="A Google Play Store Apk downloader "
                                                  "and manager for command line")
     parser.add_argument('-V', '--version', action='store_true', dest='version',
                         help="Print version number and exit")
@@ -593,6 +922,10 @@ def main():
     parser.add_argument('-s', '--search', action='store', dest='search_string', metavar="SEARCH",
                         type=str,
                         help="Search the given string in Google Play Store")
+    parser.add_argument('-sf', '--search-file', action='store', dest='search_file', metavar="FILE",
+                        type=str,
+                        help="Search each line of the given file in Google Play Store, "
+                             "concurrently, and print merged results as JSON lines")
     parser.add_argument('-P', '--paid', action='store_true', dest='paid',
                         default=False,
                         help="Also search for paid apps")
@@ -642,7 +975,7 @@ def main():
     parser.add_argument('-p', '--progress', action='store_true', dest='progress_bar',
                         help="Prompt a progress bar while downloading packages")
     parser.add_argument('-L', '--log', action='store_true', dest='logging_enable', default=False,
-                        help="Enable logging of apps status. Downloaded, failed,"
+                        help="Enable logging of apps status. Downloaded, failed, "
                              "not available apps will be written in separate logging files")
     parser.add_argument('-lo', '--locale', action='store', dest='locale',
                         type=str, metavar="LOCALE",
@@ -650,12 +983,31 @@ def main():
     parser.add_argument('-tz', '--timezone', action='store', dest='timezone',
                         type=str, metavar="TIMEZONE",
                         help="The timezone to use. Ex: CEST")
+    parser.add_argument('-I', '--index', action='store_true', dest='index_enable', default=False,
+                        help="Maintain a repository index (%s) in the download folder, "
+                             "only changed APKs are re-indexed" % repoindex.INDEX_FILENAME)
+    parser.add_argument('-A', '--archive', action='store', dest='archive_versions',
+                        metavar="NUMBER", type=util.positive_int, default=0,
+                        help="With --update, keep the given number of previous versions "
+                             "of each APK as binary deltas "
+                             "(needs bsdiff4: pip install gplaycli[archive])")
+    parser.add_argument('-R', '--restore', action='store', dest='restore',
+                        metavar=("AppID", "VERSION_CODE"), nargs=2, type=str,
+                        help="Rebuild an archived version of an APK of the folder given "
+                             "by -f into the current directory")
+    parser.add_argument('-S', '--serve', action='store', dest='serve_port', metavar="PORT",
+                        type=int, default=None,
+                        help="Serve the download folder (-f) over HTTP on the given port, "
+                             "missing APKs are downloaded on first request")
 
     if len(sys.argv) < 2:
         sys.argv.append("-h")
 
     args = parser.parse_args()
 
+    if args.archive_versions and not args.update_folder:
+        parser.error("-A/--archive can only be used with -u/--update")
+
     if args.version:
         print(__version__)
         return
@@ -675,6 +1027,16 @@ def main():
             nb_results = args.number_results
         cli.search(args.search_string, nb_results, not args.paid)
 
+    if args.search_file:
+        nb_results = 10
+        if args.number_results:
+            nb_results = args.number_results
+        _, failed = cli.search_batch(util.load_lines(args.search_file), nb_results,
+                                     not args.paid)
+        if failed:
+            logger.error("%s searches failed", len(failed))
+            sys.exit(ERRORS.SEARCH_FAILED)
+
     if args.load_from_file:
         args.packages_to_download = util.load_from_file(args.load_from_file)
 
@@ -683,6 +1045,15 @@ def main():
             cli.set_download_folder(args.dest_folder[0])
         cli.download(args.packages_to_download)
 
+    if args.restore is not None:
+        cli.set_download_folder(args.dest_folder[0])
+        if cli.restore_version(*args.restore) is None:
+            sys.exit(ERRORS.ARCHIVE_RESTORE_FAILED)
+
+    if args.serve_port is not None:
+        cli.set_download_folder(args.dest_folder[0])
+        server.serve(cli, args.serve_port)
+
 
 if __name__ == '__main__':
     main()
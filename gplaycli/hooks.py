@@ -1,10 +1,22 @@
 def connected(function):
     """
     Decorator that checks the api status
-    before doing any request
+    before doing any request.
+    An API handle is taken from the pool for
+    the duration of the call, so that concurrent
+    calls from several threads never share one.
     """
     def check_connection(self, *args, **kwargs):
-        if self.api is None or self.api.authSubToken is None:
-            self.connect()
-        return function(self, *args, **kwargs)
+        # nested call, this thread already holds a handle
+        if self.api is not None:
+            if self.api.authSubToken is None:
+                self.connect()
+            return function(self, *args, **kwargs)
+        self.api = self.acquire_api()
+        try:
+            if self.api is None or self.api.authSubToken is None:
+                self.connect()
+            return function(self, *args, **kwargs)
+        finally:
+            self.release_api()
     return check_connection
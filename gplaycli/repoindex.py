@@ -0,0 +1,124 @@
+"""
+Incremental repository index of the APKs in a folder.
+
+The index is a JSON file mapping each APK filename to its
+package name, versionCode, size, sha256 and SDK versions.
+Only entries of changed files are recomputed, and the index
+file is replaced atomically.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+from pyaxmlparser import APK
+
+from . import util
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'gplaycli-index.json'
+INDEX_VERSION = 1
+
+_index_lock = threading.Lock()
+
+
+def sha256sum(filepath, chunk_size=1024 * 1024):
+    """
+    Return the hex sha256 digest of filepath
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as fbuffer:
+        for chunk in iter(lambda: fbuffer.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_entry(filepath):
+    """
+    Compute the index entry of the APK at filepath
+    """
+    stat = os.stat(filepath)
+    apk = APK(filepath)
+    return {
+        'package': apk.package,
+        'versionCode': int(apk.version_code),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'sha256': sha256sum(filepath),
+        'minSdkVersion': apk.get_min_sdk_version(),
+        'targetSdkVersion': apk.get_target_sdk_version(),
+    }
+
+
+def load_index(folder):
+    """
+    Return the entries of the index of folder,
+    an empty dict if there is none or it is unreadable.
+    """
+    try:
+        with open(os.path.join(folder, INDEX_FILENAME), 'r') as ibuffer:
+            index = json.load(ibuffer)
+        if index.get('version') != INDEX_VERSION:
+            return {}
+        return index['apks']
+    except (IOError, ValueError, KeyError, AttributeError):
+        return {}
+
+
+def write_index(folder, entries):
+    """
+    Atomically replace the index of folder with entries
+    """
+    fd, tmppath = tempfile.mkstemp(prefix='.' + INDEX_FILENAME, dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as ibuffer:
+            json.dump({'version': INDEX_VERSION, 'apks': entries},
+                      ibuffer, indent=1, sort_keys=True)
+            ibuffer.flush()
+            os.fsync(ibuffer.fileno())
+        os.replace(tmppath, os.path.join(folder, INDEX_FILENAME))
+    except BaseException:
+        os.remove(tmppath)
+        raise
+
+
+def update_index(folder, changed=()):
+    """
+    Update the index of folder.
+    Entries of the changed filenames are recomputed, as well as
+    those of APKs whose size or mtime differ from the index.
+    Entries of removed APKs are dropped.
+    Return the list of filenames whose entry was rewritten.
+    """
+    if not os.path.isdir(folder):  # nothing was ever downloaded there
+        return []
+    with _index_lock:
+        entries = load_index(folder)
+        present = set(util.list_folder_apks(folder))
+        changed = set(changed) & present
+        updated = []
+        dirty = False
+        for filename in sorted(present):
+            entry = entries.get(filename)
+            if entry is not None and filename not in changed:
+                stat = os.stat(os.path.join(folder, filename))
+                if entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns:
+                    continue
+            logger.info("Indexing %s", filename)
+            try:
+                entries[filename] = index_entry(os.path.join(folder, filename))
+            except Exception as exc:
+                logger.error("Error while indexing %s : %s", filename, exc)
+                dirty |= entries.pop(filename, None) is not None
+                continue
+            updated.append(filename)
+        for filename in set(entries) - present:
+            del entries[filename]
+            dirty = True
+        if updated or dirty:
+            write_index(folder, entries)
+        return updated
@@ -0,0 +1,198 @@
+"""
+Local caching mirror for downloaded APKs.
+
+Serves the download folder of a GPlaycli instance over HTTP.
+Missing APKs are fetched from the Play Store on first request,
+once per package even under concurrent identical requests.
+"""
+
+import os
+import re
+import logging
+import threading
+import socketserver
+
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import unquote, urlsplit
+
+from . import repoindex
+
+logger = logging.getLogger(__name__)
+
+APK_MIMETYPE = 'application/vnd.android.package-archive'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+FILENAME_RE = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.-]*$')
+
+
+class MirrorServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    HTTP server holding the GPlaycli instance
+    used to fill the cache on misses.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, cli):
+        super().__init__(server_address, MirrorRequestHandler)
+        self.cli = cli
+        self.fetch_locks = {}
+        self.fetch_locks_lock = threading.Lock()
+
+    def fetch(self, packagename):
+        """
+        Download packagename into the cache folder,
+        unless another request already did it.
+        Only one download per package runs at a time,
+        concurrent requests wait for it to finish.
+        """
+        with self.fetch_locks_lock:
+            lock = self.fetch_locks.setdefault(packagename, threading.Lock())
+        with lock:
+            filename = packagename + ".apk"
+            filepath = os.path.join(self.cli.download_folder, filename)
+            if os.path.isfile(filepath):
+                return filepath
+            logger.info("Cache miss, downloading %s", packagename)
+            partname = filename + ".part"
+            partpath = os.path.join(self.cli.download_folder, partname)
+            downloaded = self.cli.download([[packagename, partname]])
+            if packagename in downloaded and os.path.isfile(partpath):
+                os.replace(partpath, filepath)
+                if self.cli.index_enable:
+                    repoindex.update_index(self.cli.download_folder, [filename])
+                return filepath
+            if os.path.exists(partpath):
+                os.remove(partpath)
+            return None
+
+
+class MirrorRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves files of the download folder with ETag,
+    If-None-Match and single Range support.
+    """
+    server_version = "GPlayCli"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.serve_file(send_body=True)
+
+    def do_HEAD(self):
+        self.serve_file(send_body=False)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def serve_file(self, send_body):
+        filename = unquote(urlsplit(self.path).path).lstrip('/')
+        if not FILENAME_RE.match(filename) or filename.endswith('.part'):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        filepath = os.path.join(self.server.cli.download_folder, filename)
+        if not os.path.isfile(filepath):
+            filepath = None
+            if filename.endswith('.apk'):
+                filepath = self.server.fetch(filename[:-len('.apk')])
+            if filepath is None:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+
+        with open(filepath, 'rb') as fbuffer:
+            stat = os.fstat(fbuffer.fileno())
+            size = stat.st_size
+            etag = '"%x-%x"' % (stat.st_mtime_ns, size)
+
+            if self.etag_matches(etag, self.headers.get('If-None-Match')):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            byte_range = None
+            if self.headers.get('If-Range', etag) == etag:
+                byte_range = self.parse_range(self.headers.get('Range'), size)
+            if byte_range is False:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', 'bytes */%s' % size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byte_range is None:
+                offset, count = 0, size
+                self.send_response(HTTPStatus.OK)
+            else:
+                offset, count = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header('Content-Range', 'bytes %s-%s/%s' % (offset,
+                                                                      offset + count - 1,
+                                                                      size))
+            if filename.endswith('.apk'):
+                self.send_header('Content-Type', APK_MIMETYPE)
+            else:
+                self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(count))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            self.end_headers()
+            if send_body and count:
+                # uses os.sendfile() when the platform supports it
+                self.connection.sendfile(fbuffer, offset, count)
+
+    @staticmethod
+    def etag_matches(etag, if_none_match):
+        """
+        Return True if etag is listed in the
+        If-None-Match header value.
+        """
+        if if_none_match is None:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag in tags or 'W/' + etag in tags
+
+    @staticmethod
+    def parse_range(range_header, size):
+        """
+        Parse a single range Range header.
+        Return (offset, count), None if the whole
+        file has to be served, or False if the range
+        cannot be satisfied.
+        """
+        if range_header is None:
+            return None
+        match = RANGE_RE.match(range_header.strip())
+        if match is None:  # multiple ranges or other units
+            return None
+        start, end = match.groups()
+        if not start and not end:
+            return None
+        if not start:  # suffix range, last bytes of the file
+            count = min(int(end), size)
+            if count == 0:
+                return False
+            return size - count, count
+        start = int(start)
+        if start >= size:
+            return False
+        end = size - 1 if not end else min(int(end), size - 1)
+        if end < start:
+            return None
+        return start, end - start + 1
+
+
+def serve(cli, port, address=''):
+    """
+    Serve cli.download_folder on the given port
+    until interrupted.
+    """
+    os.makedirs(cli.download_folder, exist_ok=True)
+    httpd = MirrorServer((address, port), cli)
+    logger.info("Serving %s on port %s", cli.download_folder, port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
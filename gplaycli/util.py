@@ -1,12 +1,35 @@
 import os
 import math
+import json
+import argparse
 
 def sizeof_fmt(num):
     log = int(math.log(num, 1024))
     return "%.2f%s" % (num/(1024**log), ['bytes','KB','MB','GB','TB'][log])
 
+def load_lines(filename):
+    """
+    Return the lines of filename, without line endings
+    """
+    with open(filename) as fbuffer:
+        return [line.strip('\r\n') for line in fbuffer]
+
 def load_from_file(filename):
-    return [package.strip('\r\n') for package in open(filename).readlines()]
+    """
+    Load packages from filename, one per line.
+    JSON lines, as printed by --search-file, are accepted too.
+    """
+    return [json.loads(line)['docId'] if line.startswith('{') else line
+            for line in load_lines(filename)]
+
+def positive_int(value):
+    """
+    argparse type for integers greater than zero
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("%s is not a positive number" % value)
+    return number
 
 def list_folder_apks(folder):
     """
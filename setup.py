@@ -36,4 +36,7 @@ setup(name='GPlayCli',
                 'pyaxmlparser',
                 'clint',
         ],
+        extras_require={
+                'archive': ['bsdiff4'],
+        },
 )
@@ -0,0 +1,51 @@
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.abspath('.'))
+
+from gplaycli import archive
+from gplaycli import gplaycli
+
+pytestmark = pytest.mark.skipif(not archive.HAVE_BSDIFF, reason="bsdiff4 is not installed")
+
+def update(folder, version_code, content, keep):
+    (folder / 'app.apk.part').write_bytes(content)
+    archive.commit(str(folder), 'app.apk', 'app.apk.part', 'org.app',
+                   version_code - 1, version_code, keep)
+
+def test_archive_chain(tmp_path):
+    versions = {code: b'apk content %d ' % code * 500 for code in range(1, 5)}
+    (tmp_path / 'app.apk').write_bytes(versions[1])
+    for code in range(2, 5):
+        update(tmp_path, code, versions[code], keep=2)
+    assert (tmp_path / 'app.apk').read_bytes() == versions[4]
+    assert not (tmp_path / 'app.apk.part').exists()
+    index = archive.load_versions(str(tmp_path), 'org.app')
+    assert [v['versionCode'] for v in index['versions']] == [3, 2]
+    assert index['head']['versionCode'] == 4
+    for code in (2, 3):
+        output = str(tmp_path / 'restored.apk')
+        archive.reconstruct(str(tmp_path), 'org.app', code, output)
+        with open(output, 'rb') as fbuffer:
+            assert fbuffer.read() == versions[code]
+    with pytest.raises(archive.ArchiveError):
+        archive.reconstruct(str(tmp_path), 'org.app', 1, str(tmp_path / 'restored.apk'))
+
+def test_prune_rejects_negative(tmp_path):
+    with pytest.raises(ValueError):
+        archive.prune(str(tmp_path), 'org.app', -1)
+
+def test_main_archive_needs_update(monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['gplaycli', '-A', '2', '-d', 'org.app'])
+    with pytest.raises(SystemExit) as exit_info:
+        gplaycli.main()
+    assert exit_info.value.code == 2
+
+def test_main_restore_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['gplaycli', '-ts', 'token', '-g', 'abc',
+                                      '-f', str(tmp_path), '-R', 'org.app', '3'])
+    with pytest.raises(SystemExit) as exit_info:
+        gplaycli.main()
+    assert exit_info.value.code == gplaycli.ERRORS.ARCHIVE_RESTORE_FAILED
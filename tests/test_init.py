@@ -1,5 +1,8 @@
 import sys
 import os
+import threading
+
+import pytest
 
 sys.path.insert(0, os.path.abspath('.'))
 
@@ -40,3 +43,127 @@ def test_download_focus():
     gpc.progress_bar = True
     gpc.download_folder = os.path.abspath('.')
     gpc.download(['org.mozilla.focus'])
+
+def test_config_parsed_once():
+    other = gplaycli.GPlaycli()
+    assert other.configparser is gpc.configparser
+
+def test_cached_token_max_age(tmp_path):
+    other = gplaycli.GPlaycli()
+    other.tokencachefile = str(tmp_path / 'cache' / 'token')
+    other.write_cached_token('token', 'gsfid')
+    assert other.get_cached_token() == ('token', 'gsfid')
+    with open(other.tokencachefile, 'w') as tcf:
+        tcf.write('token gsfid 0')
+    other.token_max_age = 3600
+    assert other.get_cached_token() == (None, None)
+
+def test_api_pool():
+    class FakeAPI:
+        authSubToken = 'token'
+
+    class PoolCli(gplaycli.GPlaycli):
+        created = 0
+
+        def connect(self):
+            PoolCli.created += 1
+            self.api = FakeAPI()
+
+        @gplaycli.hooks.connected
+        def current_api(self):
+            return self.api
+
+    pool_cli = PoolCli(pool_size=2)
+    first = pool_cli.current_api()
+    assert pool_cli.current_api() is first  # released handles are reused
+    assert PoolCli.created == 1
+    # a handle which never logged in is replaced by a new one
+    first.authSubToken = None
+    assert pool_cli.current_api() is not first
+    assert PoolCli.created == 2
+    # at most pool_size handles are handed out at once
+    handles = [pool_cli.acquire_api(), pool_cli.acquire_api()]
+    assert pool_cli._api_count == 2
+    assert pool_cli._api_pool.empty()
+    assert handles.count(None) == 1
+
+def test_pool_size_validated():
+    with pytest.raises(ValueError):
+        gplaycli.GPlaycli(pool_size=0)
+
+def test_search_batch(capsys):
+    import json
+    from gpapi.googleplay import LoginError
+
+    def result(doc_id, paid=False):
+        return {'offer': [{'checkoutFlowRequired': paid}], 'docId': doc_id,
+                'versionCode': 1, 'installationSize': 10}
+
+    class FakeAPI:
+        authSubToken = 'expired'
+        logins = 0
+
+        def search(self, query, nb_result):
+            if self.authSubToken == 'expired':
+                raise LoginError('expired token')
+            return [result('paid.' + query, paid=True), result('common'),
+                    result(query), result('extra.' + query)]
+
+        def login(self, authSubToken, gsfId):
+            self.logins += 1
+            self.authSubToken = authSubToken
+
+    api = FakeAPI()
+    batch_cli = gplaycli.GPlaycli(pool_size=1)
+    batch_cli._api_pool.put(api)
+    batch_cli._api_count = 1
+    batch_cli.retrieve_token = lambda force_new=False: batch_cli.set_token('fresh', 'abc')
+    seen, failed = batch_cli.search_batch(['a', 'b', 'a', ''], 2)
+    assert failed == []
+    assert api.logins == 1
+    # paid apps are skipped, 2 results per query, docIds deduplicated
+    assert seen == {'common', 'a', 'b'}
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert sorted(line['docId'] for line in lines) == ['a', 'b', 'common']
+
+def test_retrieve_token_single_flight(tmp_path, monkeypatch):
+    calls = []
+
+    class Response:
+        text = 'dispensed abc'
+
+    def fake_get(url, timeout=None):
+        calls.append(url)
+        return Response()
+
+    monkeypatch.setattr(gplaycli.requests, 'get', fake_get)
+    other = gplaycli.GPlaycli()
+    other.token_url = token_url
+    other.tokencachefile = str(tmp_path / 'token')
+    # another process already cached a newer token
+    other.write_cached_token('newer', 'abc')
+    other.set_token('stale', 'abc')
+    assert other.retrieve_token(force_new=True) == ('newer', 'abc')
+    assert calls == []
+    # the cached token is the stale one: fetch a new one
+    assert other.retrieve_token(force_new=True) == ('dispensed', 'abc')
+    assert calls == [token_url]
+    assert other.get_cached_token() == ('dispensed', 'abc')
+
+def test_retrieve_token_dispenser_down(tmp_path, monkeypatch):
+    def fake_get(url, timeout=None):
+        raise gplaycli.requests.Timeout('timed out')
+
+    monkeypatch.setattr(gplaycli.requests, 'get', fake_get)
+    other = gplaycli.GPlaycli()
+    other.token_url = token_url
+    other.tokencachefile = str(tmp_path / 'token')
+    with pytest.raises(SystemExit) as exit_info:
+        other.retrieve_token(force_new=True)
+    assert exit_info.value.code == gplaycli.ERRORS.TOKEN_DISPENSER_SERVER_ERROR
+    # the lock is released, another thread can take it
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(other._token_lock.acquire(blocking=False)))
+    thread.start()
+    thread.join()
+    assert acquired == [True]
@@ -0,0 +1,55 @@
+import sys
+import os
+import hashlib
+
+sys.path.insert(0, os.path.abspath('.'))
+
+from gplaycli import repoindex
+
+def test_sha256sum(tmp_path):
+    apk = tmp_path / 'a.apk'
+    apk.write_bytes(b'gplaycli' * 1000)
+    assert repoindex.sha256sum(str(apk), chunk_size=100) == \
+        hashlib.sha256(b'gplaycli' * 1000).hexdigest()
+
+def test_update_index_drops_invalid(tmp_path):
+    (tmp_path / 'broken.apk').write_bytes(b'not an apk')
+    repoindex.write_index(str(tmp_path), {'broken.apk': {}, 'removed.apk': {}})
+    assert repoindex.update_index(str(tmp_path)) == []
+    assert repoindex.load_index(str(tmp_path)) == {}
+
+def test_update_index_incremental(tmp_path, monkeypatch):
+    computed = []
+
+    def fake_index_entry(filepath):
+        computed.append(os.path.basename(filepath))
+        stat = os.stat(filepath)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    monkeypatch.setattr(repoindex, 'index_entry', fake_index_entry)
+    for name in ('a.apk', 'b.apk', 'c.apk'):
+        (tmp_path / name).write_bytes(name.encode())
+    assert repoindex.update_index(str(tmp_path)) == ['a.apk', 'b.apk', 'c.apk']
+    del computed[:]
+    assert repoindex.update_index(str(tmp_path)) == []
+    (tmp_path / 'b.apk').write_bytes(b'new version of b')
+    assert repoindex.update_index(str(tmp_path)) == ['b.apk']
+    assert repoindex.update_index(str(tmp_path), changed=['c.apk']) == ['c.apk']
+    assert computed == ['b.apk', 'c.apk']
+    assert sorted(repoindex.load_index(str(tmp_path))) == ['a.apk', 'b.apk', 'c.apk']
+
+def test_update_index_missing_folder(tmp_path):
+    assert repoindex.update_index(str(tmp_path / 'missing')) == []
+
+def test_download_nothing_with_index(tmp_path):
+    from gplaycli import gplaycli
+
+    class FakeAPI:
+        authSubToken = 'token'
+
+    cli = gplaycli.GPlaycli()
+    cli.index_enable = True
+    cli.download_folder = str(tmp_path / 'newdir')
+    cli.api = FakeAPI()
+    assert cli.download([]) == set()
+    assert not os.path.exists(cli.download_folder)
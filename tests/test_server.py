@@ -0,0 +1,73 @@
+import sys
+import os
+import time
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.abspath('.'))
+
+from gplaycli.server import MirrorRequestHandler, MirrorServer
+
+def test_parse_range():
+    parse_range = MirrorRequestHandler.parse_range
+    assert parse_range(None, 10) is None
+    assert parse_range('bytes=2-4', 10) == (2, 3)
+    assert parse_range('bytes=5-', 10) == (5, 5)
+    assert parse_range('bytes=-3', 10) == (7, 3)
+    assert parse_range('bytes=0-1,4-5', 10) is None
+    assert parse_range('bytes=10-', 10) is False
+
+def test_etag_matches():
+    etag_matches = MirrorRequestHandler.etag_matches
+    assert etag_matches('"a-1"', '"b-2", "a-1"')
+    assert etag_matches('"a-1"', '*')
+    assert not etag_matches('"a-1"', '"b-2"')
+    assert not etag_matches('"a-1"', None)
+
+class FakeCli:
+    index_enable = False
+
+    def __init__(self, download_folder):
+        self.download_folder = download_folder
+        self.downloads = 0
+
+    def download(self, pkg_todownload):
+        self.downloads += 1
+        time.sleep(0.2)  # let concurrent requests pile up
+        packagename, filename = pkg_todownload[0]
+        with open(os.path.join(self.download_folder, filename), 'wb') as fbuffer:
+            fbuffer.write(b'0123456789')
+        return {packagename}
+
+def test_mirror_server(tmp_path):
+    cli = FakeCli(str(tmp_path))
+    httpd = MirrorServer(('127.0.0.1', 0), cli)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%s/org.mozilla.focus.apk' % httpd.server_address[1]
+    try:
+        bodies = []
+        threads = [threading.Thread(target=lambda: bodies.append(urllib.request.urlopen(url).read()))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert bodies == [b'0123456789'] * 5
+        assert cli.downloads == 1
+        assert sorted(os.listdir(str(tmp_path))) == ['org.mozilla.focus.apk']
+
+        response = urllib.request.urlopen(urllib.request.Request(url, headers={'Range': 'bytes=2-4'}))
+        assert response.status == 206
+        assert response.read() == b'234'
+        assert response.headers['Content-Range'] == 'bytes 2-4/10'
+
+        request = urllib.request.Request(url, headers={'If-None-Match': response.headers['ETag']})
+        with pytest.raises(urllib.error.HTTPError) as not_modified:
+            urllib.request.urlopen(request)
+        assert not_modified.value.code == 304
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,28 @@
+import sys
+import os
+import argparse
+
+import pytest
+
+sys.path.insert(0, os.path.abspath('.'))
+
+from gplaycli import util
+
+def test_load_from_file_json_lines(tmp_path):
+    listfile = tmp_path / 'packages'
+    listfile.write_text('org.mozilla.focus\n'
+                        '{"query": "fire", "docId": "org.mozilla.firefox", '
+                        '"versionCode": 1, "size": 2}\n')
+    assert util.load_from_file(str(listfile)) == ['org.mozilla.focus', 'org.mozilla.firefox']
+
+def test_positive_int():
+    assert util.positive_int('3') == 3
+    with pytest.raises(argparse.ArgumentTypeError):
+        util.positive_int('-1')
+    with pytest.raises(argparse.ArgumentTypeError):
+        util.positive_int('0')
+
+def test_load_lines_keeps_json(tmp_path):
+    listfile = tmp_path / 'queries'
+    listfile.write_text('{fire\nfox\r\n')
+    assert util.load_lines(str(listfile)) == ['{fire', 'fox']